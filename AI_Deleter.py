@@ -1,15 +1,26 @@
 import customtkinter as ctk
 from tkinter import messagebox, filedialog, Text
-import pyperclip
 import threading
-import torch
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+from concurrent.futures import ThreadPoolExecutor
+import subprocess
+import time
 import re
+from bisect import bisect_left
 import json
 import os
+import warnings
 from datetime import datetime
 import tkinter as tk
 
+# Precompiled patterns for chunking, post-processing and highlighting
+_RE_SENT_SPLIT = re.compile(r'(?<=[.!?])\s+')
+_RE_COMMA_SEMI_SPLIT = re.compile(r'(?<=[,;])\s+')
+_DASH_TRANS = str.maketrans({"—": ",", "–": ","})
+_RE_COMMA_RUN = re.compile(r'[,\s]*,[,\s]*')
+_RE_COMMA_PERIOD = re.compile(r',\s*\.')
+_RE_PARAPHRASER = re.compile(r'\b(paraphraser)\b', re.IGNORECASE)
+_RE_NON_BMP = re.compile('[\U00010000-\U0010FFFF]')
+
 class ColoredTextWidget(ctk.CTkFrame):
     """Custom widget that combines CTkFrame with tkinter Text for colored text support"""
     def __init__(self, master, **kwargs):
@@ -58,24 +69,28 @@ class ColoredTextWidget(ctk.CTkFrame):
         else:
             self.text_widget.delete(start)
     
+    def replace(self, start, end, text):
+        """Replace a range of text in a single widget call"""
+        self.text_widget.replace(start, end, text)
+    
     def get(self, start, end=None):
         """Get text"""
         if end:
             return self.text_widget.get(start, end)
         return self.text_widget.get(start)
     
-    def configure(self, **kwargs):
+    def configure(self, *, height=None, font=None, wrap=None, **kwargs):
         """Configure widget properties"""
-        if "height" in kwargs:
-            self.text_widget.configure(height=kwargs["height"])
-            del kwargs["height"]
-        if "font" in kwargs:
-            self.text_widget.configure(font=kwargs["font"])
-            del kwargs["font"]
-        if "wrap" in kwargs:
-            self.text_widget.configure(wrap=kwargs["wrap"])
-            del kwargs["wrap"]
-        super().configure(**kwargs)
+        # Text options go to the inner Text widget in a single call
+        text_options = {
+            key: value
+            for key, value in (("height", height), ("font", font), ("wrap", wrap))
+            if value is not None
+        }
+        if text_options:
+            self.text_widget.configure(**text_options)
+        if kwargs:
+            super().configure(**kwargs)
 
 class TextHumanizerApp:
     def __init__(self):
@@ -92,7 +107,14 @@ class TextHumanizerApp:
         self.model_name = "Ateeqq/Text-Rewriter-Paraphraser"
         self.model = None
         self.tokenizer = None
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self._prefix_ids = []
+        self.max_batch_size = 32  # Chunks per generate call, bounds memory use on long texts
+        
+        # Workers that tokenize and decode batches while the model is generating
+        self._pool = ThreadPoolExecutor(max_workers=2)
+        self._closing = False  # Set once the window is closing, so workers stop quietly
+        self.device = self.detect_device()  # Confirmed with torch once the model loads
+        self.model_cache_dir = os.path.join(os.path.expanduser("~"), ".ai_deleter", "model_cache")
         
         # User settings (with defaults)
         self.settings = {
@@ -102,6 +124,7 @@ class TextHumanizerApp:
             "strength": "High",
             "save_intermediate": True,
             "intermediate_format": "json",
+            "pretty_json": False,  # Indent JSON intermediate outputs (slower to save)
             "highlight_paraphraser": True,  # New: highlight paraphraser word
             "highlight_intensity": 50  # New: highlight intensity (0-100)
         }
@@ -112,8 +135,23 @@ class TextHumanizerApp:
         # Settings window reference
         self.settings_window = None
         
+        # Text currently shown in the output box (None when it was cleared)
+        # and the (start, end) offsets of 'paraphraser' matches in it
+        self._last_output_text = None
+        self._highlight_spans = []
+        
+        # Time of the last progress update posted from the processing thread
+        self._last_progress_ts = 0.0
+        
         self.setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         
+    def on_closing(self):
+        """Stop queued background work and close the window"""
+        self._closing = True
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
+    
     def setup_ui(self):
         # Title
         title = ctk.CTkLabel(
@@ -128,13 +166,13 @@ class TextHumanizerApp:
         settings_frame.pack(fill="x", padx=20, pady=10)
         
         # Device info
-        device_label = ctk.CTkLabel(
+        self.device_label = ctk.CTkLabel(
             settings_frame, 
             text=f"Device: {self.device.upper()}",
             font=ctk.CTkFont(size=12, weight="bold"),
             text_color="green" if self.device == "cuda" else "orange"
         )
-        device_label.pack(side="left", padx=10)
+        self.device_label.pack(side="left", padx=10)
         
         # Model status
         self.model_status = ctk.CTkLabel(
@@ -357,6 +395,20 @@ class TextHumanizerApp:
         # Store multiple outputs
         self.all_outputs = []
         
+    def detect_device(self):
+        """Detect a CUDA GPU without importing torch, which takes seconds"""
+        try:
+            result = subprocess.run(
+                ["nvidia-smi", "-L"],
+                capture_output=True,
+                text=True,
+                timeout=2,
+                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0)
+            )
+            return "cuda" if result.returncode == 0 and "GPU" in result.stdout else "cpu"
+        except (OSError, subprocess.SubprocessError):
+            return "cpu"
+    
     def get_passes_info_text(self):
         """Get the text for passes info label"""
         if self.settings["use_custom_passes"]:
@@ -377,16 +429,181 @@ class TextHumanizerApp:
         thread.daemon = True
         thread.start()
     
+    def get_model_dtype(self):
+        """Get the weight dtype to load the model in for the current device"""
+        import torch
+        
+        if self.device != "cuda":
+            # bfloat16 only pays off on CPUs with native bf16 matmuls (AVX512-BF16 / AMX)
+            cpu_has_bf16 = (
+                getattr(torch.cpu, "_is_avx512_bf16_supported", lambda: False)()
+                or getattr(torch.cpu, "_is_amx_tile_supported", lambda: False)()
+            )
+            return torch.bfloat16 if cpu_has_bf16 else torch.float32
+        # bfloat16 keeps fp32 range (T5 can overflow in fp16), but only runs natively on
+        # Ampere or newer; older cards would emulate it, slower than float16
+        major, _ = torch.cuda.get_device_capability()
+        if major >= 8:
+            return torch.bfloat16
+        return torch.float16
+    
+    def get_model_cache_meta(self):
+        """Get the metadata that identifies a usable local model cache"""
+        return {
+            "model_name": self.model_name,
+            "dtype": str(self.get_model_dtype()),
+            "device": self.device
+        }
+    
+    def is_model_cache_valid(self, cache_meta):
+        """Check if the local model cache matches the current model settings"""
+        meta_path = os.path.join(self.model_cache_dir, "meta.json")
+        if not os.path.isfile(meta_path):
+            return False
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f) == cache_meta
+        except (OSError, ValueError):
+            return False
+    
+    def save_model_cache(self, cache_meta):
+        """Save the converted model and tokenizer so the next start loads them directly"""
+        meta_path = os.path.join(self.model_cache_dir, "meta.json")
+        try:
+            os.makedirs(self.model_cache_dir, exist_ok=True)
+            # Invalidate the old cache first, so a save cut short (e.g. the window
+            # closed mid-write) never leaves new files behind an old, matching meta.json
+            if os.path.exists(meta_path):
+                os.remove(meta_path)
+            
+            self.model.save_pretrained(self.model_cache_dir, safe_serialization=True)
+            self.tokenizer.save_pretrained(self.model_cache_dir)
+            
+            # Write metadata last so an interrupted save is never treated as valid
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump(cache_meta, f, indent=2)
+        except Exception:
+            # Caching is only an optimization; the loaded model is still usable
+            pass
+    
+    def apply_fused_kernels(self):
+        """Use optimum's BetterTransformer fused attention/layernorm kernels when available"""
+        stock_model = self.model
+        try:
+            from optimum.bettertransformer import BetterTransformer
+            # Transform a copy so the stock model survives if the fused one misbehaves
+            self.model = BetterTransformer.transform(self.model, keep_original_model=True)
+        except Exception:
+            # optimum isn't installed or doesn't support this model, keep the stock model
+            return
+        
+        if not self.warm_up_model():
+            # The fused model can't generate on this setup (masks, dtype, version mismatch)
+            self.model = stock_model
+    
+    def compile_model(self):
+        """Compile the model forward pass to cut per-token Python overhead in generate"""
+        import torch
+        
+        if self.device != "cuda" or not hasattr(torch, "compile"):
+            return
+        try:
+            # generate() calls forward once per decoded token, so compile that rather than the module.
+            # Default mode rather than "reduce-overhead": CUDA graphs would be re-recorded for every
+            # batch size, beam count and cache length, none of which the warm-up can cover
+            self.model.forward = torch.compile(
+                self.model.forward,
+                fullgraph=False,
+                dynamic=True
+            )
+        except Exception:
+            # Fall back to the eager model
+            pass
+    
+    def warm_up_model(self):
+        """Run one dummy generation so compilation, kernel selection and allocator growth happen at load time; returns whether it succeeded"""
+        import torch
+        
+        try:
+            # Two prompts of different lengths go through the real encode/generate path with
+            # the current strength's beams, so padding, the attention mask and the beam-expanded
+            # shapes are exercised as in a real batch
+            batch = self.encode_chunks(["Hello world.", "This sentence is a little longer than the first one."])
+            self.generate_paraphrases(batch, *self.get_beam_params(self.settings["strength"]))
+            if self.device == "cuda":
+                torch.cuda.synchronize()
+            return True
+        except Exception:
+            # Generation failed; drop any compiled forward so the eager one is used
+            vars(self.model).pop("forward", None)
+            return False
+    
+    def use_eager_model(self):
+        """Drop the compiled forward and fused kernels, returning whether there was anything to drop"""
+        dropped = vars(self.model).pop("forward", None) is not None
+        if getattr(self.model, "use_bettertransformer", False):
+            try:
+                from optimum.bettertransformer import BetterTransformer
+                self.model = BetterTransformer.reverse(self.model)
+                dropped = True
+            except Exception:
+                pass
+        return dropped
+    
+    def load_pretrained(self, source):
+        """Load the tokenizer and model from a hub name or local directory onto the device"""
+        from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+        
+        # Load tokenizer (the Rust-backed fast variant makes batched calls cheap)
+        self.tokenizer = AutoTokenizer.from_pretrained(source, use_fast=True)
+        if not self.tokenizer.is_fast:
+            warnings.warn(f"No fast tokenizer available for {self.model_name}; chunking will be slower")
+        
+        # Token ids of the constant task prefix, so it is never re-tokenized
+        self._prefix_ids = self.tokenizer.encode("paraphraser:", add_special_tokens=False)
+        
+        # Load model (16-bit weights on GPUs and on CPUs with native bf16, fp32 otherwise; see get_model_dtype)
+        self.model = AutoModelForSeq2SeqLM.from_pretrained(
+            source,
+            torch_dtype=self.get_model_dtype()
+        )
+        self.model.to(self.device)
+        self.model.eval()
+    
     def _load_model(self):
         """Load the model in background thread"""
         try:
-            # Load tokenizer
-            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            # Heavy imports are deferred until here so the window opens quickly
+            import torch
+            
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+            if self.device == "cuda":
+                # Allow TF32 matmuls and let cuDNN pick the fastest kernels for our small fixed shapes
+                torch.backends.cuda.matmul.allow_tf32 = True
+                torch.backends.cudnn.benchmark = True
+            
+            cache_meta = self.get_model_cache_meta()
+            from_cache = self.is_model_cache_valid(cache_meta)
+            source = self.model_cache_dir if from_cache else self.model_name
+            
+            try:
+                self.load_pretrained(source)
+            except Exception:
+                if not from_cache:
+                    raise
+                # The local copy is unreadable, fall back to the hub model (and re-cache it)
+                from_cache = False
+                self.load_pretrained(self.model_name)
+            
+            # Keep a converted copy on disk to skip the conversion on the next start
+            if not from_cache:
+                self.save_model_cache(cache_meta)
             
-            # Load model
-            self.model = AutoModelForSeq2SeqLM.from_pretrained(self.model_name)
-            self.model.to(self.device)
-            self.model.eval()
+            # Swap in fused kernels (kept only if they generate) and compile the
+            # forward pass, paying the compile cost now rather than on the first humanize
+            self.apply_fused_kernels()
+            self.compile_model()
+            self.warm_up_model()
             
             # Update UI in main thread
             self.root.after(0, self._model_loaded_success)
@@ -397,6 +614,10 @@ class TextHumanizerApp:
     
     def _model_loaded_success(self):
         """Update UI after successful model load"""
+        self.device_label.configure(
+            text=f"Device: {self.device.upper()}",
+            text_color="green" if self.device == "cuda" else "orange"
+        )
         self.model_status.configure(
             text="Model: Loaded ✓",
             text_color="green"
@@ -427,21 +648,35 @@ class TextHumanizerApp:
             f"Failed to load model:\n\n{error_msg}\n\nMake sure you have internet connection and enough disk space."
         )
     
+    def count_tokens(self, texts):
+        """Count tokens of each text with the prefix, in one batched tokenizer call"""
+        if not texts:
+            return []
+        
+        # The prefix tokens are cached, so only the texts themselves are tokenized
+        measured = self.tokenizer(
+            texts,
+            add_special_tokens=True,
+            return_length=True,
+            return_attention_mask=False,
+            return_token_type_ids=False
+        )["length"]
+        return [len(self._prefix_ids) + num_tokens for num_tokens in measured]
+    
     def split_into_chunks(self, text):
         """Split text into chunks that fit within token limit"""
         # First split into sentences
-        sentences = re.split(r'(?<=[.!?])\s+', text)
+        sentences = _RE_SENT_SPLIT.split(text)
         sentences = [s.strip() for s in sentences if s.strip()]
         
         chunks = []
         current_chunk = []
         current_tokens = 0
         
-        for sentence in sentences:
-            # Count tokens for this sentence
-            tokens = self.tokenizer.encode(f"paraphraser: {sentence}", add_special_tokens=True)
-            num_tokens = len(tokens)
-            
+        # Count tokens for all sentences
+        sentence_lengths = self.count_tokens(sentences)
+        
+        for sentence, num_tokens in zip(sentences, sentence_lengths):
             # If single sentence is too long, split it
             if num_tokens > 60:  # Increased limit
                 if current_chunk:
@@ -450,14 +685,24 @@ class TextHumanizerApp:
                     current_tokens = 0
                 
                 # Split long sentence by commas or semicolons
-                parts = re.split(r'[,;]\s+', sentence)
-                for part in parts:
-                    part_tokens = len(self.tokenizer.encode(f"paraphraser: {part}", add_special_tokens=True))
+                parts = _RE_COMMA_SEMI_SPLIT.split(sentence)
+                part_lengths = self.count_tokens(parts)
+                for part, part_tokens in zip(parts, part_lengths):
                     if part_tokens > 60:
-                        # Just add as is if still too long
-                        chunks.append(part)
+                        # Add as is if still too long, re-split only if it would be truncated
+                        if current_chunk:
+                            chunks.append(' '.join(current_chunk))
+                            current_chunk = []
+                            current_tokens = 0
+                        chunks.extend(self.fit_chunks([part]) if part_tokens > 80 else [part])
+                    elif current_tokens + part_tokens > 60:
+                        # Pack parts together like sentences below
+                        chunks.append(' '.join(current_chunk))
+                        current_chunk = [part]
+                        current_tokens = part_tokens
                     else:
-                        chunks.append(part)
+                        current_chunk.append(part)
+                        current_tokens += part_tokens
             else:
                 # Check if adding this sentence exceeds limit
                 if current_tokens + num_tokens > 60:
@@ -474,33 +719,60 @@ class TextHumanizerApp:
         
         return chunks
     
+    def fit_chunks(self, chunks, max_tokens=80):
+        """Re-split chunks whose token count would be truncated at generation"""
+        # Halves are measured in one batched call per round
+        checked = [False] * len(chunks)
+        while not all(checked):
+            unchecked = [i for i, done in enumerate(checked) if not done]
+            measured = self.tokenizer(
+                [f"paraphraser: {chunks[i]}" for i in unchecked],
+                return_length=True,
+                return_attention_mask=False,
+                return_token_type_ids=False
+            )["length"]
+            too_long = {i for i, num_tokens in zip(unchecked, measured) if num_tokens > max_tokens}
+            
+            fitted, fitted_checked = [], []
+            for i, chunk in enumerate(chunks):
+                halves = self.halve_chunk(chunk) if i in too_long else None
+                if halves:
+                    fitted.extend(halves)
+                    fitted_checked.extend([False, False])
+                else:
+                    # Fits, or is a single word that can't be split any further
+                    fitted.append(chunk)
+                    fitted_checked.append(True)
+            chunks, checked = fitted, fitted_checked
+        
+        return chunks
+    
+    def halve_chunk(self, chunk):
+        """Split a chunk in two at a sentence, then comma, then word boundary"""
+        for parts in (_RE_SENT_SPLIT.split(chunk), _RE_COMMA_SEMI_SPLIT.split(chunk), chunk.split()):
+            if len(parts) > 1:
+                middle = len(parts) // 2
+                return ' '.join(parts[:middle]), ' '.join(parts[middle:])
+        return None
+    
     def humanize_output(self, text):
         """Post-process text to make it more human-like"""
         result = text
         
         # Remove AI-typical long dashes and replace with commas
         if self.settings["remove_dashes"]:
-            # Replace em-dash (—) and en-dash (–) with comma
-            result = re.sub(r'\s*[—–]\s*', ', ', result)
-            
-            # Also handle cases where dashes are used without spaces
-            result = re.sub(r'[—–]', ', ', result)
-            
-            # Clean up any double commas
-            result = re.sub(r',\s*,', ',', result)
+            # Turn em-dash (—) and en-dash (–) into commas
+            result = result.translate(_DASH_TRANS)
             
-            # Fix spacing around commas
-            result = re.sub(r'\s*,\s*', ', ', result)
+            # Collapse double commas and fix spacing around them in one sweep
+            result = _RE_COMMA_RUN.sub(', ', result)
             
             # Remove comma before period
-            result = re.sub(r',\s*\.', '.', result)
+            result = _RE_COMMA_PERIOD.sub('.', result)
         
         # Remove other AI patterns (optional enhancements)
-        # Remove multiple spaces
-        result = re.sub(r'\s+', ' ', result)
-        
-        # Trim
-        result = result.strip()
+        # Remove multiple spaces and trim (str.split drops whitespace runs and both ends in C)
+        result = ' '.join(result.split())
         
         return result
     
@@ -514,18 +786,16 @@ class TextHumanizerApp:
         self.settings["highlight_paraphraser"] = self.highlight_toggle.get()
         # Re-apply highlighting to current output
         if self.all_outputs:
-            self.apply_highlighting(self.output_text.get("1.0", "end"))
+            self.apply_highlighting(self.get_displayed_output())
     
     def update_highlight_intensity(self, value):
         """Update highlight intensity"""
         intensity = int(float(value))
         self.settings["highlight_intensity"] = intensity
         self.intensity_value.configure(text=f"{intensity}%")
-        # Update highlight color based on intensity
+        # Update highlight color based on intensity (matches are already tagged, so
+        # recoloring the tag is all that's needed)
         self.update_highlight_color()
-        # Re-apply highlighting if enabled
-        if self.settings["highlight_paraphraser"] and self.all_outputs:
-            self.apply_highlighting(self.output_text.get("1.0", "end"))
     
     def update_highlight_color(self):
         """Update highlight color based on intensity"""
@@ -537,30 +807,54 @@ class TextHumanizerApp:
         # Update the tag configuration
         self.output_text.text_widget.tag_config("paraphraser", foreground=color_hex, background="#2C2C2C")
     
+    def is_output_shown(self, text):
+        """Check whether text is already displayed, unedited, in the output box"""
+        return text == self._last_output_text and not self.output_text.text_widget.edit_modified()
+    
+    def get_displayed_output(self):
+        """Get the text shown in the output box, only reading the widget if the user edited it"""
+        if self._last_output_text is None or self.output_text.text_widget.edit_modified():
+            return self.output_text.get("1.0", "end-1c")
+        return self._last_output_text
+    
+    def find_highlight_spans(self, text):
+        """Find 'paraphraser' matches in text as (start, end) offsets in Tk text characters"""
+        spans = [match.span() for match in _RE_PARAPHRASER.finditer(text)]
+        if not spans or tk.TkVersion >= 9.0:
+            return spans
+        
+        # Tcl 8.6 counts a character outside the BMP (e.g. an emoji) as two, so shift
+        # each match by the number of such characters before it
+        non_bmp = [match.start() for match in _RE_NON_BMP.finditer(text)]
+        if not non_bmp:
+            return spans
+        shifted = []
+        for start, end in spans:
+            shift = bisect_left(non_bmp, start)
+            shifted.append((start + shift, end + shift))
+        return shifted
+    
     def apply_highlighting(self, text):
         """Apply highlighting to paraphraser words in text"""
-        # Clear current text
-        self.output_text.delete("1.0", "end")
-        
-        if not self.settings["highlight_paraphraser"]:
-            # Just insert text without highlighting
-            self.output_text.insert("1.0", text)
-            return
-        
-        # Split text and apply highlighting
-        pattern = r'\b(paraphraser)\b'
-        parts = re.split(f'({pattern})', text, flags=re.IGNORECASE)
+        text_widget = self.output_text.text_widget
+        # If the user edited the output box, the buffer no longer matches the cached text
+        previous = None if text_widget.edit_modified() else self._last_output_text
+        
+        # Unchanged text (highlight settings changed) keeps the buffer and cached matches
+        if text != previous:
+            # New text: rewrite the buffer and find its matches
+            self._highlight_spans = self.find_highlight_spans(text)
+            self.output_text.replace("1.0", "end", text)
+            self._last_output_text = text
+            text_widget.edit_modified(False)
+        
+        text_widget.tag_remove("paraphraser", "1.0", "end")
+        if self.settings["highlight_paraphraser"]:
+            for start, end in self._highlight_spans:
+                text_widget.tag_add("paraphraser", f"1.0+{start}c", f"1.0+{end}c")
         
         # Count occurrences
-        paraphraser_count = 0
-        
-        # Insert parts with appropriate tags
-        for part in parts:
-            if re.match(pattern, part, re.IGNORECASE):
-                self.output_text.insert("end", part, "paraphraser")
-                paraphraser_count += 1
-            elif part:
-                self.output_text.insert("end", part)
+        paraphraser_count = len(self._highlight_spans) if self.settings["highlight_paraphraser"] else 0
         
         # Update info label
         if paraphraser_count > 0:
@@ -746,6 +1040,16 @@ class TextHumanizerApp:
         format_selector.set(self.settings["intermediate_format"].upper())
         format_selector.pack(anchor="w", padx=10, pady=5)
         
+        pretty_json_switch = ctk.CTkSwitch(
+            scroll_frame,
+            text="Indent JSON (easier to read, slower to save)",
+            onvalue=True,
+            offvalue=False
+        )
+        if self.settings["pretty_json"]:
+            pretty_json_switch.select()
+        pretty_json_switch.pack(anchor="w", padx=10, pady=5)
+        
         # NEW: Highlight paraphraser setting
         highlight_label = ctk.CTkLabel(
             scroll_frame,
@@ -839,23 +1143,18 @@ class TextHumanizerApp:
         # Bind entry change
         passes_entry.bind("<KeyRelease>", update_passes)
         
-        # Function to update dash setting
-        def update_dash(*args):
-            self.settings["remove_dashes"] = dash_switch.get()
-            
-        dash_switch.configure(command=update_dash)
-        
-        # Function to update intermediate setting
-        def update_intermediate(*args):
-            self.settings["save_intermediate"] = intermediate_switch.get()
-            
-        intermediate_switch.configure(command=update_intermediate)
+        # Bind widgets that just store their value in a setting
+        def bind_setting(widget, key, transform=None):
+            def update_setting(*args):
+                value = widget.get()
+                self.settings[key] = transform(value) if transform else value
+                
+            widget.configure(command=update_setting)
         
-        # Function to update format setting
-        def update_format(*args):
-            self.settings["intermediate_format"] = format_selector.get().lower()
-            
-        format_selector.configure(command=update_format)
+        bind_setting(dash_switch, "remove_dashes")
+        bind_setting(intermediate_switch, "save_intermediate")
+        bind_setting(format_selector, "intermediate_format", str.lower)
+        bind_setting(pretty_json_switch, "pretty_json")
         
         # Function to update highlight setting
         def update_highlight(*args):
@@ -864,8 +1163,7 @@ class TextHumanizerApp:
             self.highlight_toggle.select() if highlight_switch.get() else self.highlight_toggle.deselect()
             # Re-apply highlighting if needed
             if self.all_outputs:
-                current_output = self.output_text.get("1.0", "end")
-                self.apply_highlighting(current_output)
+                self.apply_highlighting(self.get_displayed_output())
             
         highlight_switch.configure(command=update_highlight)
         
@@ -877,12 +1175,8 @@ class TextHumanizerApp:
             # Update main UI slider
             self.intensity_slider.set(intensity)
             self.intensity_value.configure(text=f"{intensity}%")
-            # Update highlight color
+            # Update highlight color (recolors the existing tags, no re-highlighting needed)
             self.update_highlight_color()
-            # Re-apply highlighting if enabled
-            if self.settings["highlight_paraphraser"] and self.all_outputs:
-                current_output = self.output_text.get("1.0", "end")
-                self.apply_highlighting(current_output)
             
         intensity_slider_settings.configure(command=update_intensity_settings)
         
@@ -897,6 +1191,17 @@ class TextHumanizerApp:
         )
         close_btn.pack(pady=20)
     
+    def _toast(self, msg, color="green"):
+        """Show a message in the status label for a few seconds without blocking"""
+        self.status_label.configure(text=msg, text_color=color)
+        
+        def clear_toast():
+            # Leave the label alone if something else updated it meanwhile
+            if self.status_label.cget("text") == msg:
+                self.status_label.configure(text=f"Ready - Using {self.device.upper()}", text_color="green")
+                
+        self.root.after(3000, clear_toast)
+    
     def save_intermediate_outputs(self):
         """Save intermediate outputs to file"""
         if not self.intermediate_outputs:
@@ -926,8 +1231,8 @@ class TextHumanizerApp:
             return
         
         try:
-            if self.settings["intermediate_format"] == "json":
-                # Save as JSON
+            if self.settings["intermediate_format"] == "json" and self.settings["pretty_json"]:
+                # Save as indented JSON
                 output_data = {
                     "timestamp": timestamp,
                     "settings": self.settings,
@@ -938,45 +1243,70 @@ class TextHumanizerApp:
                 with open(filename, 'w', encoding='utf-8') as f:
                     json.dump(output_data, f, indent=2, ensure_ascii=False)
                     
-                messagebox.showinfo("Success", f"Intermediate outputs saved to:\n{filename}")
+                self._toast(f"✓ Intermediate outputs saved to {os.path.basename(filename)}")
+                
+            elif self.settings["intermediate_format"] == "json":
+                # Save as compact JSON, streamed one chunk at a time instead of
+                # encoding the whole document into one string first
+                with open(filename, 'w', encoding='utf-8', buffering=1 << 20) as f:
+                    f.write('{"timestamp": ' + json.dumps(timestamp))
+                    f.write(', "settings": ' + json.dumps(self.settings, ensure_ascii=False))
+                    f.write(', "intermediate_outputs": [')
+                    for i, chunk_data in enumerate(self.intermediate_outputs):
+                        if i:
+                            f.write(', ')
+                        f.write(json.dumps(chunk_data, ensure_ascii=False))
+                    f.write('], "final_outputs": ' + json.dumps(self.all_outputs, ensure_ascii=False) + '}')
+                    
+                self._toast(f"✓ Intermediate outputs saved to {os.path.basename(filename)}")
                 
             else:
-                # Save as TXT
-                with open(filename, 'w', encoding='utf-8') as f:
-                    f.write(f"Intermediate Outputs - {timestamp}\n")
-                    f.write("=" * 50 + "\n\n")
+                # Save as TXT, collecting lines and writing them in large blocks
+                parts = []
+                ap = parts.append
+                
+                with open(filename, 'w', encoding='utf-8', buffering=1 << 20) as f:
+                    ap(f"Intermediate Outputs - {timestamp}\n")
+                    ap("=" * 50 + "\n\n")
                     
                     # Write settings
-                    f.write("SETTINGS:\n")
-                    f.write(f"  Strength: {self.settings['strength']}\n")
-                    f.write(f"  Custom Passes: {self.settings['custom_passes']}\n")
-                    f.write(f"  Use Custom Passes: {self.settings['use_custom_passes']}\n")
-                    f.write(f"  Remove Dashes: {self.settings['remove_dashes']}\n\n")
+                    ap("SETTINGS:\n")
+                    ap(f"  Strength: {self.settings['strength']}\n")
+                    ap(f"  Custom Passes: {self.settings['custom_passes']}\n")
+                    ap(f"  Use Custom Passes: {self.settings['use_custom_passes']}\n")
+                    ap(f"  Remove Dashes: {self.settings['remove_dashes']}\n\n")
                     
                     # Write intermediate outputs
-                    f.write("INTERMEDIATE OUTPUTS:\n")
-                    f.write("=" * 50 + "\n\n")
+                    ap("INTERMEDIATE OUTPUTS:\n")
+                    ap("=" * 50 + "\n\n")
                     
                     for i, chunk_data in enumerate(self.intermediate_outputs):
-                        f.write(f"CHUNK {i + 1}:\n")
-                        f.write("-" * 30 + "\n")
+                        ap(f"CHUNK {i + 1}:\n")
+                        ap("-" * 30 + "\n")
                         
                         for pass_num, outputs in enumerate(chunk_data['outputs']):
-                            f.write(f"\n  Pass {pass_num + 1}:\n")
+                            ap(f"\n  Pass {pass_num + 1}:\n")
                             for j, output in enumerate(outputs):
-                                f.write(f"    Version {j + 1}: {output[:100]}...\n")
-                        f.write("\n")
+                                ap(f"    Version {j + 1}: {output[:100]}...\n")
+                        ap("\n")
+                        
+                        # Flush periodically so huge runs don't hold every line in memory
+                        if len(parts) >= 10000:
+                            f.write(''.join(parts))
+                            parts.clear()
                     
                     # Write final outputs
-                    f.write("\nFINAL OUTPUTS:\n")
-                    f.write("=" * 50 + "\n\n")
+                    ap("\nFINAL OUTPUTS:\n")
+                    ap("=" * 50 + "\n\n")
                     
                     for i, output in enumerate(self.all_outputs):
-                        f.write(f"Version {i + 1}:\n")
-                        f.write("-" * 30 + "\n")
-                        f.write(output + "\n\n")
+                        ap(f"Version {i + 1}:\n")
+                        ap("-" * 30 + "\n")
+                        ap(output + "\n\n")
+                    
+                    f.write(''.join(parts))
                 
-                messagebox.showinfo("Success", f"Intermediate outputs saved to:\n{filename}")
+                self._toast(f"✓ Intermediate outputs saved to {os.path.basename(filename)}")
                 
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save file:\n{str(e)}")
@@ -997,6 +1327,7 @@ class TextHumanizerApp:
         self.humanize_btn.configure(state="disabled", text="Processing...")
         self.status_label.configure(text="Splitting text into chunks...", text_color="orange")
         self.output_text.delete("1.0", "end")
+        self._last_output_text = None
         self.progress_bar.set(0)
         self.output_info_label.configure(text="")
         
@@ -1008,6 +1339,68 @@ class TextHumanizerApp:
         thread.daemon = True
         thread.start()
     
+    def encode_chunks(self, chunks):
+        """Tokenize a batch of chunks into padded model inputs"""
+        # Add the required prefix and tokenize all chunks into one padded batch
+        batch = self.tokenizer(
+            [f"paraphraser: {chunk}" for chunk in chunks],
+            return_tensors="pt",
+            padding="longest",
+            truncation=True,
+            max_length=80
+        )
+        
+        # Page-locked memory lets the copy to the GPU run without blocking this thread
+        if self.device == "cuda":
+            for key in ("input_ids", "attention_mask"):
+                batch[key] = batch[key].pin_memory()
+        
+        return batch
+    
+    def generate_paraphrases(self, batch, num_beams, repetition_penalty):
+        """Run one generate call over an encoded batch, 4 sequences per chunk"""
+        import torch
+        
+        # Paraphrases stay close to the input length, so don't decode far past it
+        input_len = batch.input_ids.shape[1]
+        max_length = min(80, max(20, int(1.3 * input_len)))
+        
+        # Generate with aggressive humanization parameters
+        with torch.inference_mode():
+            return self.model.generate(
+                input_ids=batch.input_ids.to(self.device, non_blocking=True),
+                attention_mask=batch.attention_mask.to(self.device, non_blocking=True),
+                num_beams=num_beams,
+                num_return_sequences=4,
+                repetition_penalty=repetition_penalty,
+                length_penalty=1.5,
+                no_repeat_ngram_size=3,
+                max_length=max_length,
+                min_length=10,
+                early_stopping=True,
+                do_sample=False
+            )
+    
+    def decode_paraphrases(self, outputs, num_chunks):
+        """Decode generated sequences into 4 humanized versions per chunk"""
+        # Decode the outputs (4 consecutive sequences per chunk)
+        decoded = self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+        
+        # Apply post-processing humanization
+        decoded = [self.humanize_output(p) for p in decoded]
+        
+        # Regroup into 4 different outputs per chunk
+        return [decoded[i * 4:(i + 1) * 4] for i in range(num_chunks)]
+    
+    def get_beam_params(self, strength):
+        """Get (num_beams, repetition_penalty) for a humanization strength"""
+        if strength == "Standard":
+            return 4, 10.0
+        elif strength == "High":
+            return 8, 12.0
+        else:  # Maximum
+            return 10, 15.0
+    
     def _process_text(self, input_content):
         """Process text in background thread"""
         try:
@@ -1021,15 +1414,7 @@ class TextHumanizerApp:
                 passes = {"Standard": 1, "High": 1, "Maximum": 2}[strength]
             
             # Adjust beam parameters based on strength
-            if strength == "Standard":
-                num_beams = 4
-                repetition_penalty = 10.0
-            elif strength == "High":
-                num_beams = 8
-                repetition_penalty = 12.0
-            else:  # Maximum
-                num_beams = 10
-                repetition_penalty = 15.0
+            num_beams, repetition_penalty = self.get_beam_params(strength)
             
             # Split text into optimal chunks
             chunks = self.split_into_chunks(input_content)
@@ -1039,75 +1424,82 @@ class TextHumanizerApp:
                           f"Processing with {passes} pass{'es' if passes != 1 else ''}...")
             
             # Process each chunk and collect 4 versions
-            all_versions = [[], [], [], []]  # 4 different versions
+            all_versions = [[None] * len(chunks) for _ in range(4)]  # 4 different versions
             
-            chunk_counter = 0
-            for chunk_index, chunk in enumerate(chunks):
-                # Initialize chunk data for intermediate outputs
-                if self.settings["save_intermediate"]:
-                    chunk_data = {
+            # Initialize chunk data for intermediate outputs
+            if self.settings["save_intermediate"]:
+                self.intermediate_outputs = [
+                    {
                         'original': chunk,
                         'outputs': []  # Will store outputs for each pass
                     }
+                    for chunk in chunks
+                ]
+            
+            # Process all chunks in batches (potentially multiple times for Maximum strength)
+            processed_chunks = chunks
+            
+            # Beam search is deterministic, so text already paraphrased in this run (left
+            # unchanged by a pass, or repeated in the input) reuses its outputs
+            paraphrase_cache = {}
+            
+            chunk_counter = 0
+            for pass_num in range(passes):
+                pending_chunks = [c for c in dict.fromkeys(processed_chunks) if c not in paraphrase_cache]
+                chunk_counter += len(processed_chunks) - len(pending_chunks)
                 
-                # Process chunk (potentially multiple times for Maximum strength)
-                processed_chunk = chunk
+                batches = [
+                    pending_chunks[batch_start:batch_start + self.max_batch_size]
+                    for batch_start in range(0, len(pending_chunks), self.max_batch_size)
+                ]
                 
-                for pass_num in range(passes):
-                    # Update progress
-                    self.root.after(0, self._update_progress, chunk_counter, total_chunks, 
-                                  f"Processing chunk {chunk_counter+1}/{total_chunks}")
-                    
-                    # Add the required prefix
-                    prefixed_text = f"paraphraser: {processed_chunk}"
-                    
-                    # Tokenize
-                    input_ids = self.tokenizer(
-                        prefixed_text,
-                        return_tensors="pt",
-                        padding="longest",
-                        truncation=True,
-                        max_length=80
-                    ).input_ids.to(self.device)
+                # Tokenize the next batch and decode the previous one on the worker pool
+                # while the current batch is generating
+                decoding = []
+                next_encoding = self._pool.submit(self.encode_chunks, batches[0]) if batches else None
+                for batch_index, batch_chunks in enumerate(batches):
+                    batch = next_encoding.result()
+                    if batch_index + 1 < len(batches):
+                        next_encoding = self._pool.submit(self.encode_chunks, batches[batch_index + 1])
                     
-                    # Generate with aggressive humanization parameters
-                    with torch.no_grad():
-                        outputs = self.model.generate(
-                            input_ids,
-                            num_beams=num_beams,
-                            num_return_sequences=4,
-                            repetition_penalty=repetition_penalty,
-                            length_penalty=1.5,
-                            no_repeat_ngram_size=3,
-                            max_length=80,
-                            min_length=10,
-                            early_stopping=True,
-                            do_sample=False
-                        )
+                    # Update progress (at most ~20 times a second to avoid flooding the Tk event queue)
+                    now = time.monotonic()
+                    if now - self._last_progress_ts > 0.05:
+                        self.root.after(0, self._update_progress, chunk_counter, total_chunks, 
+                                      f"Processing chunks {chunk_counter+1}-{chunk_counter+len(batch_chunks)}/{total_chunks}")
+                        self._last_progress_ts = now
                     
-                    # Decode the 4 different outputs
-                    paraphrases = self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
-                    
-                    # Apply post-processing humanization
-                    paraphrases = [self.humanize_output(p) for p in paraphrases]
-                    
-                    # Save intermediate outputs if enabled
-                    if self.settings["save_intermediate"]:
-                        chunk_data['outputs'].append(paraphrases.copy())
-                    
-                    # For multiple passes, use first output as input for next pass
-                    if pass_num < passes - 1:
-                        processed_chunk = paraphrases[0]
-                    
-                    chunk_counter += 1
+                    try:
+                        outputs = self.generate_paraphrases(batch, num_beams, repetition_penalty)
+                    except Exception:
+                        # Fused or compiled kernels can fail on inputs the warm-up didn't cover;
+                        # retry once on the stock eager model
+                        if not self.use_eager_model():
+                            raise
+                        outputs = self.generate_paraphrases(batch, num_beams, repetition_penalty)
+                    decoding.append(
+                        (batch_chunks, self._pool.submit(self.decode_paraphrases, outputs, len(batch_chunks)))
+                    )
+                    chunk_counter += len(batch_chunks)
                 
-                # Add chunk data to intermediate outputs
+                for batch_chunks, decoded in decoding:
+                    paraphrase_cache.update(zip(batch_chunks, decoded.result()))
+                
+                chunk_paraphrases = [paraphrase_cache[chunk] for chunk in processed_chunks]
+                
+                # Save intermediate outputs if enabled
                 if self.settings["save_intermediate"]:
-                    self.intermediate_outputs.append(chunk_data)
+                    for chunk_data, paraphrases in zip(self.intermediate_outputs, chunk_paraphrases):
+                        chunk_data['outputs'].append(paraphrases)
                 
-                # Add final results to each version
+                # For multiple passes, use first output as input for next pass
+                if pass_num < passes - 1:
+                    processed_chunks = [paraphrases[0] for paraphrases in chunk_paraphrases]
+            
+            # Add final results to each version
+            for chunk_index, paraphrases in enumerate(chunk_paraphrases):
                 for i, paraphrase in enumerate(paraphrases):
-                    all_versions[i].append(paraphrase)
+                    all_versions[i][chunk_index] = paraphrase
             
             # Join chunks for each version
             self.all_outputs = [' '.join(version) for version in all_versions]
@@ -1119,6 +1511,9 @@ class TextHumanizerApp:
             self.root.after(0, self._update_output, self.all_outputs[0], True)
             
         except Exception as e:
+            if self._closing:
+                # The pool was shut down and the window destroyed; nothing left to report to
+                return
             error_msg = f"Error during processing:\n{str(e)}"
             self.root.after(0, self._update_output, error_msg, False)
     
@@ -1139,8 +1534,9 @@ class TextHumanizerApp:
         # Get the selected output
         output_text = self.all_outputs[version_num]
         
-        # Apply highlighting
-        self.apply_highlighting(output_text)
+        # Apply highlighting, unless this version is identical to what is already shown
+        if not self.is_output_shown(output_text):
+            self.apply_highlighting(output_text)
         
         self.status_label.configure(
             text=f"Showing {choice}",
@@ -1150,7 +1546,8 @@ class TextHumanizerApp:
     def _update_output(self, text, success):
         """Update output text box (called from main thread)"""
         # Apply highlighting
-        self.apply_highlighting(text)
+        if not self.is_output_shown(text):
+            self.apply_highlighting(text)
         
         self.humanize_btn.configure(state="normal", text="🤖 Humanize Entire Text")
         
@@ -1183,19 +1580,40 @@ class TextHumanizerApp:
             messagebox.showwarning("No Output", "No text to copy.")
             return
         
+        # Clipboard access can block (e.g. on X11), so copy in a separate thread
+        thread = threading.Thread(target=self._copy_to_clipboard, args=(output_content,))
+        thread.daemon = True
+        thread.start()
+    
+    def _copy_to_clipboard(self, output_content):
+        """Copy text to clipboard in background thread"""
         try:
+            import pyperclip
             pyperclip.copy(output_content)
-            self.status_label.configure(
-                text="✓ Copied to clipboard",
-                text_color="green"
-            )
+            
+            # Update UI in main thread
+            self.root.after(0, self._copy_success)
+            
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to copy: {str(e)}")
+            error_msg = str(e)
+            self.root.after(0, self._copy_error, error_msg)
+    
+    def _copy_success(self):
+        """Update UI after copying to clipboard"""
+        self.status_label.configure(
+            text="✓ Copied to clipboard",
+            text_color="green"
+        )
+    
+    def _copy_error(self, error_msg):
+        """Show clipboard copy error"""
+        messagebox.showerror("Error", f"Failed to copy: {error_msg}")
     
     def clear_all(self):
         """Clear all text boxes"""
         self.input_text.delete("1.0", "end")
         self.output_text.delete("1.0", "end")
+        self._last_output_text = None
         self.all_outputs = []
         self.intermediate_outputs = []
         self.progress_bar.set(0)